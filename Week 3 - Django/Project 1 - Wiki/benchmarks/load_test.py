@@ -0,0 +1,114 @@
+"""
+Load test for the Wiki. For each corpus size it generates synthetic
+entries in a temporary entries/ directory, builds the search index, and
+drives the index, entry, search and random page views through Django's
+test client. It reports latency percentiles and requests per second.
+
+Usage (from the project directory):
+    python benchmarks/load_test.py --sizes 1000 10000 100000 --requests 500
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wiki.settings")
+
+import django  # noqa: E402
+django.setup()
+
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases  # noqa: E402
+
+from encyclopedia import links, search_index, util  # noqa: E402
+
+
+WORDS = ("python django html css markdown encyclopedia article language framework browser "
+         "server database query index cache request response template static render").split()
+
+
+def generate_corpus(directory, size, seed=0):
+    """ Writes `size` synthetic entries, linking to each other, and returns their titles. """
+    rng = random.Random(seed)
+    titles = [f"{rng.choice(WORDS).title()} {i}" for i in range(size)]
+    os.makedirs(os.path.join(directory, "entries"))
+    for title in titles:
+        paragraphs = [" ".join(rng.choices(WORDS, k=rng.randint(20, 80))) for _ in range(rng.randint(2, 8))]
+        linked = rng.choice(titles)
+        content = f"# {title}\n\n" + "\n\n".join(paragraphs) + f"\n\nSee also [{linked}](/wiki/{linked}).\n"
+        with open(os.path.join(directory, "entries", f"{title}.md"), "w", encoding="utf-8") as f:
+            f.write(content)
+    return titles
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(client, name, paths, warmup=10):
+    for path in paths[:warmup]:
+        client.get(path)
+    timings = []
+    start = time.perf_counter()
+    for path in paths:
+        request_start = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - request_start)
+        if response.status_code not in (200, 302):
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<12} p50 {percentile(timings, 0.50) * 1000:8.2f} ms"
+          f"  p95 {percentile(timings, 0.95) * 1000:8.2f} ms"
+          f"  p99 {percentile(timings, 0.99) * 1000:8.2f} ms"
+          f"  mean {statistics.mean(timings) * 1000:8.2f} ms"
+          f"  {len(paths) / elapsed:9.1f} req/s")
+
+
+def benchmark(size, requests, seed):
+    directory = tempfile.mkdtemp(prefix="wiki-load-test-")
+    try:
+        with override_settings(MEDIA_ROOT=directory, ALLOWED_HOSTS=["testserver"]):
+            start = time.perf_counter()
+            titles = generate_corpus(directory, size, seed)
+            util.invalidate_title_index()
+            entries = [(title, util.get_entry(title)) for title in titles]
+            search_index.rebuild(entries)
+            links.rebuild(entries)
+            print(f"{size} entries (corpus and indexes built in {time.perf_counter() - start:.1f}s)")
+
+            rng = random.Random(seed)
+            client = Client()
+            run(client, "index", ["/"] * requests)
+            run(client, "entry", [f"/wiki/{rng.choice(titles)}" for _ in range(requests)])
+            run(client, "search", [f"/search?q={rng.choice(WORDS)}" for _ in range(requests)])
+            run(client, "random_page", ["/random_page"] * requests)
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Corpus sizes to test.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per view and corpus size.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus and requests.")
+    args = parser.parse_args()
+
+    # a throwaway test database, so the real search index and cache are untouched
+    setup_test_environment()
+    databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        for size in args.sizes:
+            benchmark(size, args.requests, args.seed)
+    finally:
+        teardown_databases(databases, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
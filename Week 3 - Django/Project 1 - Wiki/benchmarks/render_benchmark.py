@@ -0,0 +1,78 @@
+"""
+Measures Markdown renders per second on the entries/ corpus, scaled up
+synthetically to the requested number of documents.
+
+Usage (from the project directory):
+    python benchmarks/render_benchmark.py --count 5000 --workers 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import markdown2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wiki.settings")
+
+import django  # noqa: E402
+django.setup()
+
+from encyclopedia import render  # noqa: E402
+
+
+def load_corpus(directory):
+    corpus = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".md"):
+            with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                corpus.append(f.read())
+    return corpus
+
+
+def scale_corpus(corpus, count, seed=0):
+    """
+    Returns `count` documents made by concatenating a few shuffled
+    paragraphs of the sample entries, so that documents differ in
+    length and content like real articles do.
+    """
+    rng = random.Random(seed)
+    paragraphs = [paragraph for content in corpus for paragraph in content.split("\n\n") if paragraph.strip()]
+    documents = []
+    for i in range(count):
+        body = rng.choices(paragraphs, k=rng.randint(5, 60))
+        documents.append(f"# Article {i}\n\n" + "\n\n".join(body))
+    return documents
+
+
+def measure(name, documents, func):
+    start = time.perf_counter()
+    func(documents)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {len(documents) / elapsed:>10.1f} renders/sec ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000, help="Number of documents to render.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--entries", default="entries", help="Directory with the sample .md entries.")
+    args = parser.parse_args()
+
+    extras = render.default_extras()
+    documents = scale_corpus(load_corpus(args.entries), args.count)
+    size = sum(len(document) for document in documents)
+    print(f"{len(documents)} documents, {size / len(documents):.0f} characters on average, extras={extras}")
+
+    measure("markdown2.markdown() per call", documents,
+            lambda docs: [markdown2.markdown(doc, extras=extras) for doc in docs])
+    measure("render.render()", documents,
+            lambda docs: [render.render(doc, extras) for doc in docs])
+    measure("render.render_many()", documents,
+            lambda docs: list(render.render_many(docs, workers=args.workers, extras=extras)))
+
+
+if __name__ == "__main__":
+    main()
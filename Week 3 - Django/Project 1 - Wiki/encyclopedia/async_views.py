@@ -0,0 +1,156 @@
+"""
+Async versions of the read-only Wiki views, for serving under ASGI
+(wiki/asgi.py). Storage, database and cache access is blocking, so it
+runs in a thread through sync_to_async while the event loop keeps
+serving other requests. Enabled with the WIKI_ASYNC_VIEWS setting.
+
+Database and cache calls run thread-sensitively, on the one thread
+Django's connection handling expects. Storage reads, hashing, Markdown
+rendering, compression and title index lookups run with
+thread_sensitive=False, in the thread pool, so concurrent readers do not
+queue behind each other on that single thread.
+"""
+
+import random
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from . import links, pages, util
+from .render import render as render_markdown
+
+
+async_render = sync_to_async(render)
+
+
+def in_pool(func):
+    """ Wraps a blocking function that touches neither the database nor the cache. """
+    return sync_to_async(func, thread_sensitive=False)
+
+
+async def title_index():
+    # only reading the generation token needs the cache
+    generation = await sync_to_async(util.entries_generation)()
+    return await in_pool(util.title_index)(generation)
+
+
+async def index(request):
+    index = await title_index()
+
+    # the full listing is streamed, so it never has to be held in memory
+    if request.GET.get('all'):
+        head, tail = await sync_to_async(pages.index_frame)(request)
+        ordered = await in_pool(lambda: index.ordered[0])()
+        return StreamingHttpResponse(pages.stream_index(head, ordered, tail))
+
+    letter = request.GET.get('letter')
+    # the sorted titles are built lazily, so paging runs in the pool
+    entries, next_cursor, letters = await in_pool(_index_page)(index, letter, request.GET.get('after'))
+    return await async_render(request, "encyclopedia/index.html", {
+        "entries": entries,
+        "letters": letters,
+        "letter": letter,
+        "next_cursor": next_cursor
+    })
+
+
+def _index_page(index, letter, after):
+    entries, next_cursor = index.page(
+        letter=letter,
+        after=after,
+        size=getattr(settings, 'WIKI_INDEX_PAGE_SIZE', 200)
+    )
+    return entries, next_cursor, index.letters
+
+
+async def entry(request, title):
+    # answer If-None-Match with 304 before anything is rendered,
+    # like the condition() decorator does for the sync view
+    version = await in_pool(util.get_entry_version)(title)
+    backlinks = await sync_to_async(links.backlinks)(title) if version else []
+    encoding = await sync_to_async(pages.entry_encoding)(request)
+    etag = pages.entry_etag(version, backlinks) if version else None
+    quoted_etag = quote_etag(pages.encoded_etag(etag, encoding)) if etag else None
+    response = get_conditional_response(request, etag=quoted_etag)
+
+    if response is None:
+        response = await _entry_response(request, title, version, backlinks, etag, encoding)
+
+    if request.method in ('GET', 'HEAD') and quoted_etag and not response.has_header('ETag'):
+        response['ETag'] = quoted_etag
+    return response
+
+
+async def _entry_response(request, title, version, backlinks, etag, encoding):
+    """ Async counterpart of views._entry_response, reusing the version and backlinks already read. """
+    cacheable = encoding is not None and etag is not None
+    body = await sync_to_async(pages.cached_entry_page)(title, etag, encoding) if cacheable else None
+    if body is not None:
+        response = pages.compressed_response(body, encoding)
+    else:
+        html = await _entry_html(title, version)
+        response = await async_render(request, "encyclopedia/entry.html", {
+            "title": title,
+            "entry": html,
+            "backlinks": backlinks if html is not None else []
+        })
+        if cacheable:
+            bodies = await in_pool(pages.compress_entry_page)(response.content)
+            await sync_to_async(pages.cache_entry_page)(title, etag, bodies)
+            response = pages.compressed_response(bodies[encoding], encoding)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+async def _entry_html(title, version):
+    """ Returns the entry's HTML, reading and rendering it in the thread pool on a render cache miss. """
+    if not version:
+        return None
+    html = await sync_to_async(util.get_cached_entry_html)(title, version)
+    if html is None:
+        content = await in_pool(util.get_entry)(title)
+        if content is None:
+            return None
+        html = await in_pool(render_markdown)(content)
+        await sync_to_async(util.cache_entry_html)(title, content, html)
+    return html
+
+
+async def search(request):
+    search_query = request.GET.get('q')
+    index = await title_index()
+
+    # If the query matches the name of an encyclopedia entry,
+    # the user should be redirected to that entry's page.
+    title = index.by_lower.get(search_query.lower())
+    if title is not None:
+        return HttpResponseRedirect(reverse("entry", args=[title]))
+
+    # otherwise the user should instead be taken to a search results page that
+    # displays a list of all encyclopedia entries that have the query as a substring,
+    # followed by entries mentioning the query in their content, best match first;
+    # the trigram map is built lazily, so the title lookups run in the pool too
+    search_results = await in_pool(index.containing)(search_query)
+    title_matches = set(search_results)
+    # the built-in search index is in the database, a backend's own is not
+    search_entries = sync_to_async(util.search_entries, thread_sensitive=not util.backend().supports_search)
+    content_matches = await search_entries(search_query)
+    search_results += [title for title in content_matches if title not in title_matches]
+    suggestions = [] if search_results else await in_pool(index.similar)(search_query)
+    return await async_render(request, "encyclopedia/search.html", {
+        "search_results": search_results,
+        # "did you mean" suggestions for misspelt titles
+        "suggestions": suggestions
+    })
+
+
+async def random_page(request):
+    titles = (await title_index()).titles
+    if not titles:
+        return HttpResponseRedirect(reverse("index"))
+    return HttpResponseRedirect(reverse("entry", args=[random.choice(titles)]))
@@ -0,0 +1,242 @@
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+
+
+class EditConflict(Exception):
+    """ Raised when an entry changed since the version an edit was based on. """
+
+
+def content_version(content):
+    """
+    Returns the version tag of an entry's content: a hash of it, or an
+    empty string for an entry that does not exist.
+    """
+    if content is None:
+        return ""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# the process umask, for the mode of saved entries when FILE_UPLOAD_PERMISSIONS is None
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def check_title(title):
+    """ Raises SuspiciousFileOperation if the title contains a path separator. """
+    if "/" in title or "\\" in title or os.sep in title:
+        raise SuspiciousFileOperation(f"Entry title {title!r} contains a path separator.")
+
+
+def check_version(current_content, expected_version):
+    if expected_version is not None and content_version(current_content) != expected_version:
+        raise EditConflict()
+
+
+class FileBackend:
+    """ Stores each entry as a Markdown file in the entries/ directory of the default storage. """
+
+    supports_search = False
+
+    def stamp(self):
+        """
+        Returns the modification time of the entries directory. Adding,
+        removing or renaming an entry file changes it, so it is enough to
+        tell whether the title index is stale.
+        """
+        try:
+            return os.stat(default_storage.path("entries")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def list_entries(self):
+        _, filenames = default_storage.listdir("entries")
+        return sorted(re.sub(r"\.md$", "", filename)
+                      for filename in filenames if filename.endswith(".md"))
+
+    @contextmanager
+    def open_entry(self, title):
+        """
+        Yields the raw bytes of the entry as a read-only memory map (or
+        b"" for an empty file), or None if the entry does not exist. The
+        content can be hashed, sliced or decoded without reading the
+        whole file into a separate buffer first.
+        """
+        try:
+            f = open(default_storage.path(f"entries/{title}.md"), "rb")
+        except FileNotFoundError:
+            yield None
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def get_entry(self, title):
+        with self.open_entry(title) as mapped:
+            # decoding straight from the map copies the content only once
+            return str(mapped, "utf-8") if mapped is not None else None
+
+    def version(self, title):
+        """ Returns content_version() of the entry, hashing the mapped file without decoding it. """
+        with self.open_entry(title) as mapped:
+            return hashlib.sha256(mapped).hexdigest() if mapped is not None else ""
+
+    def entry_path(self, title):
+        """
+        Returns the path of the entry's file. Raises SuspiciousFileOperation
+        for a title that would put it outside the entries directory.
+        """
+        check_title(title)
+        # default_storage rejects paths outside its location
+        return default_storage.path(f"entries/{title}.md")
+
+    def save_entry(self, title, content, expected_version=None):
+        """
+        Writes the entry to a temporary file and renames it over the old
+        one, so readers see either the old or the new content, never a
+        missing or partial file. With expected_version, raises
+        EditConflict instead if the entry has changed since that version.
+        """
+        path = self.entry_path(title)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(content)
+            # mkstemp creates the file owner-only, give it the mode of an uploaded file
+            mode = default_storage.file_permissions_mode
+            os.chmod(temp_path, mode if mode is not None else 0o666 & ~_umask)
+            # the version check and the rename must not interleave with another writer's
+            with self._entry_lock(directory, title):
+                if expected_version is not None and self.version(title) != expected_version:
+                    raise EditConflict()
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    @contextmanager
+    def _entry_lock(self, directory, title):
+        """ Holds an exclusive lock on the entry, shared by all threads and processes. """
+        with open(os.path.join(directory, f".{title}.lock"), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SQLiteBackend:
+    """
+    Stores entries in a SQLite database, with an FTS5 table for
+    full-text search. The database is created on first use.
+    """
+
+    supports_search = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            title TEXT PRIMARY KEY,
+            content TEXT NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(title, content);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+    """
+
+    def __init__(self, path="entries.sqlite3"):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # sqlite3 connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def stamp(self):
+        """ Returns a counter that is incremented on every write. """
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0]
+
+    def list_entries(self):
+        rows = self.connection.execute("SELECT title FROM entries ORDER BY title")
+        return [title for title, in rows]
+
+    def get_entry(self, title):
+        row = self.connection.execute("SELECT content FROM entries WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    def save_entry(self, title, content, expected_version=None):
+        if expected_version is None:
+            self.save_entries([(title, content)])
+            return
+        # the version check and the write happen in one write transaction
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            check_version(self.get_entry(title), expected_version)
+            self._write(connection, title, content)
+
+    def save_entries(self, entries):
+        """ Saves many (title, content) pairs in a single transaction. """
+        with self.connection as connection:
+            for title, content in entries:
+                self._write(connection, title, content)
+
+    def _write(self, connection, title, content):
+        connection.execute(
+            "INSERT INTO entries (title, content) VALUES (?, ?) "
+            "ON CONFLICT (title) DO UPDATE SET content = excluded.content",
+            (title, content))
+        # the full-text row shares the rowid of the entry row
+        rowid, = connection.execute("SELECT rowid FROM entries WHERE title = ?", (title,)).fetchone()
+        connection.execute("DELETE FROM entries_fts WHERE rowid = ?", (rowid,))
+        connection.execute("INSERT INTO entries_fts (rowid, title, content) VALUES (?, ?, ?)",
+                           (rowid, title, content))
+        connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    def search(self, query, limit=50):
+        """ Returns titles of entries matching any word of the query, ranked by bm25. """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " OR ".join(f'"{word}"' for word in words)
+        rows = self.connection.execute(
+            "SELECT title FROM entries_fts WHERE entries_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit))
+        return [title for title, in rows]
@@ -0,0 +1,35 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# content encodings we can produce, most preferred first
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(data, encoding):
+    """ Returns the bytes compressed with the given content encoding. """
+    if encoding == "br":
+        return brotli.compress(data)
+    if encoding == "gzip":
+        # a fixed mtime keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def accepted_encoding(accept_encoding):
+    """
+    Returns the most preferred encoding in ENCODINGS that the given
+    Accept-Encoding header allows, or None.
+    """
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q=") and quality[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return next((encoding for encoding in ENCODINGS if encoding in accepted), None)
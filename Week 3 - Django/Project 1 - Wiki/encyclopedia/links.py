@@ -0,0 +1,70 @@
+import re
+from urllib.parse import unquote
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Link
+
+
+# inline [text](/wiki/Title) and reference style [id]: /wiki/Title links
+LINK_RE = re.compile(r"""(?:\]\(\s*|^\s*\[[^\]]+\]:\s*)<?/?wiki/([^)\s>#?"']+)""", re.MULTILINE)
+
+
+def extract_links(content):
+    """ Returns the set of entry titles the Markdown content links to. """
+    return {unquote(target) for target in LINK_RE.findall(content)}
+
+
+def _links(title, content):
+    return [Link(source=title, target=target) for target in sorted(extract_links(content))]
+
+
+@transaction.atomic
+def update(title, content):
+    """ Replaces the outgoing links of a single entry with those of its new content. """
+    Link.objects.filter(source=title).delete()
+    Link.objects.bulk_create(_links(title, content))
+
+
+@transaction.atomic
+def rebuild(entries, batch_size=1000):
+    """
+    Rebuilds the whole link graph from an iterable of (title, content)
+    pairs. Returns the number of links found.
+    """
+    Link.objects.all().delete()
+    count = 0
+    links = []
+    for title, content in entries:
+        links.extend(_links(title, content))
+        if len(links) >= batch_size:
+            count += len(links)
+            Link.objects.bulk_create(links)
+            links = []
+    count += len(links)
+    Link.objects.bulk_create(links)
+    return count
+
+
+def backlinks(title):
+    """ Returns the sorted titles of the entries linking to the given entry. """
+    return list(Link.objects.filter(target=title).order_by("source").values_list("source", flat=True))
+
+
+def broken_links(titles):
+    """
+    Returns (source, target) pairs of links whose target is not one of
+    the given existing titles, sorted by source.
+    """
+    titles = set(titles)
+    return [(source, target) for source, target
+            in Link.objects.order_by("source", "target").values_list("source", "target")
+            if target not in titles]
+
+
+def orphans(titles):
+    """ Returns the given titles that no other entry links to. """
+    # links from an entry to itself do not count
+    linked = set(Link.objects.exclude(source=F("target")).values_list("target", flat=True))
+    return [title for title in titles if title not in linked]
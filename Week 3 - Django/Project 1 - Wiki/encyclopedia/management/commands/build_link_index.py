@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import links, util
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the graph of links between encyclopedia entries."
+
+    def handle(self, *args, **options):
+        entries = ((title, util.get_entry(title)) for title in util.list_entries())
+        count = links.rebuild(entries)
+        self.stdout.write(self.style.SUCCESS(f"Found {count} links."))
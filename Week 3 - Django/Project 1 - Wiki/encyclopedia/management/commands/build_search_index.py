@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from encyclopedia import search_index, util
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index from all encyclopedia entries."
+
+    def handle(self, *args, **options):
+        entries = ((title, util.get_entry(title)) for title in util.list_entries())
+        count = search_index.rebuild(entries)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} entries."))
@@ -0,0 +1,49 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.management.commands import collectstatic
+
+from encyclopedia import compression
+
+
+# file types worth compressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".html", ".svg", ".txt", ".json", ".xml", ".map")
+
+
+class Command(collectstatic.Command):
+    help = (collectstatic.Command.help +
+            " Also writes precompressed .gz (and .br, if brotli is installed) files next to text files.")
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--no-compress", action="store_false", dest="compress",
+                            help="Do not write precompressed copies of the collected files.")
+
+    def handle(self, **options):
+        result = super().handle(**options)
+        if options["compress"] and not options["dry_run"]:
+            count = self.compress_files(settings.STATIC_ROOT)
+            if options["verbosity"] >= 1:
+                self.stdout.write(f"{count} precompressed files written.")
+        return result
+
+    def compress_files(self, root):
+        """ Writes a compressed sibling of every compressible file under root. """
+        count = 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                    continue
+                path = os.path.join(directory, filename)
+                with open(path, "rb") as f:
+                    data = f.read()
+                for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+                    if encoding not in compression.ENCODINGS:
+                        continue
+                    compressed = compression.compress(data, encoding)
+                    # small files can grow when compressed
+                    if len(compressed) < len(data):
+                        with open(path + suffix, "wb") as f:
+                            f.write(compressed)
+                        count += 1
+        return count
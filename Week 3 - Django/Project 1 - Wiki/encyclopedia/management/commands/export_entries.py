@@ -0,0 +1,30 @@
+import io
+import json
+import tarfile
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import util
+
+
+class Command(BaseCommand):
+    help = "Exports all entries to a JSONL file, or to a tarball of .md files if the path ends in .tar[.gz]."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        titles = util.list_entries()
+        if path.endswith((".tar", ".tar.gz", ".tgz")):
+            with tarfile.open(path, "w:gz" if not path.endswith(".tar") else "w") as tar:
+                for title in titles:
+                    data = util.get_entry(title).encode("utf-8")
+                    info = tarfile.TarInfo(f"{title}.md")
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                for title in titles:
+                    f.write(json.dumps({"title": title, "content": util.get_entry(title)}) + "\n")
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(titles)} entries to {path}."))
@@ -0,0 +1,87 @@
+import itertools
+import json
+import os
+import tarfile
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from encyclopedia import links, render, search_index, util
+from encyclopedia.backends import check_title
+
+
+def read_entries(path):
+    """
+    Yields (title, content) pairs from a JSONL file with one
+    {"title": ..., "content": ...} object per line, or from a tarball
+    of <title>.md files. Raises CommandError for a title that is not
+    a valid entry title.
+    """
+    for title, content in _read_records(path):
+        try:
+            check_title(title)
+        except SuspiciousFileOperation as e:
+            raise CommandError(str(e))
+        yield title, content
+
+
+def _read_records(path):
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["title"], record["content"]
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as tar:
+            for member in tar:
+                name = os.path.basename(member.name)
+                if member.isfile() and name.endswith(".md"):
+                    yield name[:-len(".md")], tar.extractfile(member).read().decode("utf-8")
+    else:
+        raise CommandError(f"{path} is neither a .jsonl file nor a tarball.")
+
+
+class Command(BaseCommand):
+    help = ("Imports entries from a JSONL file or a tarball of .md files, pre-rendering "
+            "them in parallel into the render cache and rebuilding the search and link indexes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file or (compressed) tarball to import.")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Number of render processes (default: one per CPU).")
+        parser.add_argument("--chunk-size", type=int, default=64,
+                            help="Entries handed to a render process at a time.")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Entries read, rendered and saved at a time.")
+
+    def handle(self, *args, **options):
+        backend = util.backend()
+        start = time.perf_counter()
+        count = 0
+        entries = read_entries(options["path"])
+        # entries are handled in batches, so only one batch of the dump is in memory at a time
+        with render.RenderPool(workers=options["workers"]) as pool:
+            while True:
+                batch = list(itertools.islice(entries, options["batch_size"]))
+                if not batch:
+                    break
+                rendered = pool.render_many((content for _, content in batch), chunksize=options["chunk_size"])
+                # one transaction per batch rather than one commit per revision and cache entry
+                with transaction.atomic():
+                    for (title, content), html in zip(batch, rendered):
+                        util.write_entry(title, content)
+                        util.cache_entry_html(title, content, html)
+                count += len(batch)
+        util.invalidate_title_index()
+
+        # one index rebuild instead of an incremental update per entry
+        if not backend.supports_search:
+            search_index.rebuild((title, util.get_entry(title)) for title in util.list_entries())
+        links.rebuild((title, util.get_entry(title)) for title in util.list_entries())
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {count} entries in {elapsed:.2f}s ({count / elapsed:.1f} entries/sec)."))
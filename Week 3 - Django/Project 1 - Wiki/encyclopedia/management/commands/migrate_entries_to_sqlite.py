@@ -0,0 +1,24 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from encyclopedia.backends import FileBackend, SQLiteBackend
+
+
+class Command(BaseCommand):
+    help = "Copies all entries from the entries/*.md files into a SQLite entry database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=os.path.join(settings.BASE_DIR, "entries.sqlite3"),
+            help="Path of the SQLite database to write (created if missing).",
+        )
+
+    def handle(self, *args, **options):
+        source = FileBackend()
+        target = SQLiteBackend(options["path"])
+        titles = source.list_entries()
+        target.save_entries((title, source.get_entry(title)) for title in titles)
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(titles)} entries to {options['path']}."))
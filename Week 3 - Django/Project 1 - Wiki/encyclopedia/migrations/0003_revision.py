@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0002_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Revision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('number', models.PositiveIntegerField()),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('snapshot', models.TextField(blank=True, null=True)),
+                ('delta', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('title', 'number')},
+            },
+        ),
+    ]
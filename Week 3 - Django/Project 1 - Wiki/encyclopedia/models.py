@@ -1,3 +1,48 @@
 from django.db import models
 
-# Create your models here.
+
+class IndexedEntry(models.Model):
+    """ Class to represent an entry in the full-text search index. """
+    title = models.CharField(max_length=255, unique=True)
+    length = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.title} | {self.length} tokens"
+
+
+class Posting(models.Model):
+    """ Class to represent how many times a token occurs in an entry. """
+    token = models.CharField(max_length=100, db_index=True)
+    entry = models.ForeignKey(IndexedEntry, on_delete=models.CASCADE, related_name='postings')
+    frequency = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.token} | {self.entry.title} | {self.frequency}"
+
+
+class Link(models.Model):
+    """ Class to represent a link from one entry to another. """
+    source = models.CharField(max_length=255, db_index=True)
+    target = models.CharField(max_length=255, db_index=True)
+
+    def __str__(self):
+        return f"{self.source} -> {self.target}"
+
+
+class Revision(models.Model):
+    """
+    Class to represent one saved version of an entry. Every few revisions
+    the full content is stored as a snapshot, the others only store a
+    delta against the previous revision.
+    """
+    title = models.CharField(max_length=255)
+    number = models.PositiveIntegerField()
+    created_time = models.DateTimeField(auto_now_add=True)
+    snapshot = models.TextField(blank=True, null=True)
+    delta = models.TextField(blank=True, null=True)
+
+    class Meta:
+        unique_together = [('title', 'number')]
+
+    def __str__(self):
+        return f"{self.title} | #{self.number} | {'snapshot' if self.snapshot is not None else 'delta'} | {self.created_time}"
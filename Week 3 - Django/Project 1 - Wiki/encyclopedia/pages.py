@@ -0,0 +1,77 @@
+import hashlib
+import uuid
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import format_html
+
+from . import compression, util
+from . import render as render_service
+
+
+def index_frame(request):
+    """ Returns the index page markup before and after the list of titles. """
+    placeholder = f"<!-- {uuid.uuid4()} -->"
+    page = render_to_string("encyclopedia/index.html", {
+        "entries_placeholder": placeholder
+    }, request=request)
+    head, tail = page.split(placeholder)
+    return head, tail
+
+
+def stream_index(head, titles, tail):
+    """ Yields the index page with every title, one list item at a time. """
+    yield head
+    for title in titles:
+        yield format_html('<li><a href="{}">{}</a></li>\n', reverse("entry", args=[title]), title)
+    yield tail
+
+
+def entry_etag(version, backlinks):
+    """ Returns the ETag of an entry page, given the entry's version and backlinks. """
+    backlinks = "\n".join(backlinks)
+    return util.entry_version(f"{version}\n{backlinks}")
+
+
+def encoded_etag(etag, encoding):
+    # each encoding is a different representation of the page, so it gets its own strong ETag
+    return f"{etag}-{encoding}" if etag and encoding else etag
+
+
+def entry_encoding(request):
+    """ Returns the encoding to serve the entry page in, or None to serve it uncompressed. """
+    # pages showing flash messages are specific to one user, so they are not cached
+    if len(messages.get_messages(request)):
+        return None
+    return compression.accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+
+def _entry_page_key(title, etag, encoding):
+    # the page embeds rendered HTML, so it is also keyed by the render configuration
+    key = f"{title}\0{etag}\0{encoding}\0{render_service.signature()}"
+    return "entry_page:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def cached_entry_page(title, etag, encoding):
+    """ Returns the compressed entry page from the cache, or None. """
+    return cache.get(_entry_page_key(title, etag, encoding))
+
+
+def compress_entry_page(page):
+    """ Returns the page compressed with every supported encoding, keyed by encoding. """
+    return {encoding: compression.compress(page, encoding) for encoding in compression.ENCODINGS}
+
+
+def cache_entry_page(title, etag, bodies):
+    """ Caches the page in every encoding at once, so each is compressed only once per edit. """
+    cache.set_many({_entry_page_key(title, etag, encoding): body for encoding, body in bodies.items()}, None)
+
+
+def compressed_response(body, encoding):
+    response = HttpResponse(body)
+    response['Content-Encoding'] = encoding
+    return response
+
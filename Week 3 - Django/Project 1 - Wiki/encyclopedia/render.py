@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import markdown2
+
+
+# bump when a change to this module changes the HTML it renders
+RENDERER_VERSION = 1
+
+_local = threading.local()
+
+
+def default_extras():
+    """ Returns the markdown2 extras configured by the WIKI_MARKDOWN_EXTRAS setting. """
+    from django.conf import settings
+    return list(getattr(settings, "WIKI_MARKDOWN_EXTRAS", []))
+
+
+def signature(extras=None):
+    """
+    Returns a string that changes whenever the HTML rendered from the same
+    content may change: with this module, markdown2 or the extras.
+    """
+    if extras is None:
+        extras = default_extras()
+    return f"{RENDERER_VERSION}\0{markdown2.__version__}\0{list(extras)!r}"
+
+
+def _markdown(extras):
+    # Markdown instances are reused, but they keep state while converting,
+    # so each thread gets its own
+    key = tuple(extras)
+    instances = getattr(_local, "instances", None)
+    if instances is None:
+        instances = _local.instances = {}
+    instance = instances.get(key)
+    if instance is None:
+        instance = instances[key] = markdown2.Markdown(extras=list(extras))
+    return instance
+
+
+def render(content, extras=None):
+    """ Converts Markdown content to HTML with a reusable, preconfigured converter. """
+    if extras is None:
+        extras = default_extras()
+    return str(_markdown(extras).convert(content))
+
+
+def _init_worker(extras):
+    global _worker_extras
+    _worker_extras = extras
+
+
+def _render_in_worker(content):
+    return str(_markdown(_worker_extras).convert(content))
+
+
+class RenderPool:
+    """
+    A pool of worker processes rendering Markdown, kept open across
+    several batches. The workers only need markdown2, not Django. Use
+    it as a context manager, so the workers are shut down.
+    """
+
+    def __init__(self, workers=None, extras=None):
+        if extras is None:
+            extras = default_extras()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(extras,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown()
+
+    def render_many(self, contents, chunksize=64):
+        """ Returns an iterator of the HTML of the contents, in the same order. """
+        return self.executor.map(_render_in_worker, contents, chunksize=chunksize)
+
+
+def render_many(contents, workers=None, chunksize=64, extras=None):
+    """
+    Renders an iterable of Markdown contents in a pool of worker processes
+    and returns an iterator of the HTML, in the same order. Every content
+    is submitted at once, so use a RenderPool to render a large number of
+    them in batches.
+    """
+    with RenderPool(workers, extras) as pool:
+        yield from pool.render_many(contents, chunksize)
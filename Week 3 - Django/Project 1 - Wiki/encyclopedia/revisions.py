@@ -0,0 +1,93 @@
+import difflib
+import json
+
+from django.db import IntegrityError, transaction
+
+from .models import Revision
+
+
+# a full snapshot is stored every SNAPSHOT_INTERVAL revisions, so rebuilding
+# any revision applies at most SNAPSHOT_INTERVAL - 1 deltas
+SNAPSHOT_INTERVAL = 10
+
+
+def make_delta(old, new):
+    """
+    Returns a JSON delta turning the old content into the new one: a list
+    of ["=", start, end] (keep those lines of the old content) and
+    ["+", lines] (insert these lines) operations.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    operations = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append(["=", i1, i2])
+        elif j1 < j2:
+            operations.append(["+", new_lines[j1:j2]])
+    return json.dumps(operations)
+
+
+def apply_delta(old, delta):
+    """ Returns the content produced by applying a delta to the old content. """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = []
+    for operation in json.loads(delta):
+        if operation[0] == "=":
+            new_lines.extend(old_lines[operation[1]:operation[2]])
+        else:
+            new_lines.extend(operation[1])
+    return "".join(new_lines)
+
+
+def history(title):
+    """ Returns the revisions of an entry, newest first. """
+    return Revision.objects.filter(title=title).order_by("-number").defer("snapshot", "delta")
+
+
+def content_at(title, number):
+    """
+    Returns the content of the given revision of an entry, or None if it
+    does not exist. Starts from the closest snapshot at or before it.
+    """
+    snapshot_number = (number - 1) // SNAPSHOT_INTERVAL * SNAPSHOT_INTERVAL + 1
+    revisions = list(Revision.objects
+                     .filter(title=title, number__gte=snapshot_number, number__lte=number)
+                     .order_by("number"))
+    if not revisions or revisions[-1].number != number:
+        return None
+    content = revisions[0].snapshot
+    for revision in revisions[1:]:
+        content = apply_delta(content, revision.delta)
+    return content
+
+
+def has_history(title):
+    return Revision.objects.filter(title=title).exists()
+
+
+def record(title, content, retries=3):
+    """ Appends the content as the newest revision of the entry. """
+    for attempt in range(retries):
+        try:
+            with transaction.atomic():
+                latest = Revision.objects.filter(title=title).order_by("-number").first()
+                number = latest.number + 1 if latest else 1
+                if number % SNAPSHOT_INTERVAL == 1:
+                    Revision.objects.create(title=title, number=number, snapshot=content)
+                else:
+                    previous = content_at(title, latest.number)
+                    Revision.objects.create(title=title, number=number,
+                                            delta=make_delta(previous, content))
+                return number
+        except IntegrityError:
+            # a concurrent save took this revision number, try the next one
+            if attempt == retries - 1:
+                raise
+
+
+def diff_lines(old, new, old_label="", new_label=""):
+    """ Returns the lines of a unified diff between two contents. """
+    return list(difflib.unified_diff(old.splitlines(), new.splitlines(),
+                                     old_label, new_label, lineterm=""))
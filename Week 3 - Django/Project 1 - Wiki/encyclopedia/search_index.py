@@ -0,0 +1,81 @@
+import math
+import re
+from collections import Counter
+
+from django.db import transaction
+
+from .models import IndexedEntry, Posting
+
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 100
+
+
+def tokenize(text):
+    """ Splits text into lowercase word tokens. """
+    return [token for token in TOKEN_RE.findall(text.lower())
+            if len(token) <= MAX_TOKEN_LENGTH]
+
+
+def _postings(entry, content):
+    tokens = tokenize(content)
+    entry.length = len(tokens)
+    return [Posting(token=token, entry=entry, frequency=frequency)
+            for token, frequency in Counter(tokens).items()]
+
+
+@transaction.atomic
+def update(title, content):
+    """ Replaces the postings of a single entry with those of its new content. """
+    entry, _ = IndexedEntry.objects.get_or_create(title=title)
+    entry.postings.all().delete()
+    postings = _postings(entry, content)
+    entry.save()
+    Posting.objects.bulk_create(postings)
+
+
+@transaction.atomic
+def rebuild(entries, batch_size=1000):
+    """
+    Rebuilds the whole index from an iterable of (title, content) pairs.
+    Returns the number of entries indexed.
+    """
+    Posting.objects.all().delete()
+    IndexedEntry.objects.all().delete()
+    count = 0
+    postings = []
+    for title, content in entries:
+        entry = IndexedEntry(title=title)
+        entry_postings = _postings(entry, content)
+        entry.save()
+        postings.extend(entry_postings)
+        if len(postings) >= batch_size:
+            Posting.objects.bulk_create(postings)
+            postings = []
+        count += 1
+    Posting.objects.bulk_create(postings)
+    return count
+
+
+def search(query, limit=50):
+    """
+    Returns titles of entries containing any token of the query, best
+    match first. Only the posting lists of the query tokens are read,
+    so the cost does not grow with the number of entries.
+    """
+    tokens = set(tokenize(query))
+    if not tokens:
+        return []
+    rows = list(Posting.objects.filter(token__in=tokens)
+                .values_list("token", "entry__title", "entry__length", "frequency"))
+    if not rows:
+        return []
+    entry_count = IndexedEntry.objects.count()
+    document_frequency = Counter(token for token, _, _, _ in rows)
+
+    # tf-idf, with term frequency normalized by entry length
+    scores = Counter()
+    for token, title, length, frequency in rows:
+        idf = math.log(1 + entry_count / document_frequency[token])
+        scores[title] += frequency / math.sqrt(max(length, 1)) * idf
+    return [title for title, _ in scores.most_common(limit)]
@@ -0,0 +1,50 @@
+import re
+from collections import Counter
+
+from django.utils.text import slugify
+
+
+ATX_HEADING_RE = re.compile(rb"^(#{1,6})[ \t]+(.+?)[ \t]*#*[ \t]*$")
+FENCE_RE = re.compile(rb"^(```|~~~)")
+
+
+def build_section_index(data):
+    """
+    Returns the sections of UTF-8 Markdown content as a list of dicts
+    with the heading level, title, slug (matching the heading's id in
+    the rendered HTML) and the byte offsets [start, end) of the section.
+    A section runs until the next heading of the same or a higher level,
+    so it includes its subsections.
+    """
+    sections = []
+    slug_counts = Counter()
+    in_fence = False
+    offset = 0
+    for line in bytes(data).splitlines(keepends=True):
+        stripped = line.rstrip(b"\r\n")
+        if FENCE_RE.match(stripped):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = ATX_HEADING_RE.match(stripped)
+            if match:
+                level = len(match.group(1))
+                title = match.group(2).decode("utf-8", "replace")
+                slug = slugify(title)
+                # repeated headings get numbered ids, like markdown2 does
+                slug_counts[slug] += 1
+                if not slug or slug_counts[slug] > 1:
+                    slug = f"{slug}-{slug_counts[slug]}"
+                # close the open sections this heading ends
+                for section in reversed(sections):
+                    if section["end"] is not None:
+                        continue
+                    if section["level"] < level:
+                        break
+                    section["end"] = offset
+                sections.append({"level": level, "title": title, "slug": slug,
+                                 "start": offset, "end": None})
+        offset += len(line)
+    for section in sections:
+        if section["end"] is None:
+            section["end"] = offset
+    return sections
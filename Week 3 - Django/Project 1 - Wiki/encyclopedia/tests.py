@@ -1,3 +1,320 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import links, revisions, search_index, sections, util
+from .backends import EditConflict, FileBackend, content_version
+
+
+class TemporaryMediaMixin:
+    """ Points the default storage at a new empty directory for each test. """
+
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+@override_settings(FILE_UPLOAD_PERMISSIONS=0o644)
+class FileBackendSaveTests(TemporaryMediaMixin, TestCase):
+    """ Atomic writes, edit conflicts and title checks of FileBackend.save_entry. """
+
+    def setUp(self):
+        super().setUp()
+        self.backend = FileBackend()
+        self.entries = os.path.join(self.root, "entries")
+
+    def entry_files(self):
+        # leaves out the lock files
+        return [name for name in os.listdir(self.entries) if not name.startswith(".")]
+
+    def test_save_replaces_content_without_leaving_temporary_files(self):
+        self.backend.save_entry("Python", "first")
+        self.backend.save_entry("Python", "second")
+        self.assertEqual(self.backend.get_entry("Python"), "second")
+        self.assertEqual(self.entry_files(), ["Python.md"])
+
+    def test_saved_entry_has_upload_permissions(self):
+        self.backend.save_entry("Python", "content")
+        mode = os.stat(os.path.join(self.entries, "Python.md")).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o644)
+
+    def test_failed_rename_keeps_old_content(self):
+        self.backend.save_entry("Python", "old")
+        with mock.patch("encyclopedia.backends.os.replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.backend.save_entry("Python", "new")
+        self.assertEqual(self.backend.get_entry("Python"), "old")
+        self.assertEqual(self.entry_files(), ["Python.md"])
+
+    def test_save_with_current_version(self):
+        self.backend.save_entry("Python", "old")
+        self.backend.save_entry("Python", "new", expected_version=content_version("old"))
+        self.assertEqual(self.backend.get_entry("Python"), "new")
+
+    def test_save_with_stale_version_raises_conflict(self):
+        self.backend.save_entry("Python", "old")
+        self.backend.save_entry("Python", "changed")
+        with self.assertRaises(EditConflict):
+            self.backend.save_entry("Python", "new", expected_version=content_version("old"))
+        self.assertEqual(self.backend.get_entry("Python"), "changed")
+
+    def test_concurrent_edits_of_the_same_version_conflict(self):
+        self.backend.save_entry("Python", "old")
+        version = content_version("old")
+        read_version = FileBackend.version
+
+        def slow_version(backend, title):
+            # widens the window between the version check and the rename
+            result = read_version(backend, title)
+            time.sleep(0.2)
+            return result
+
+        results = {}
+
+        def edit(content):
+            try:
+                self.backend.save_entry("Python", content, expected_version=version)
+                results[content] = "saved"
+            except EditConflict:
+                results[content] = "conflict"
+
+        with mock.patch.object(FileBackend, "version", slow_version):
+            threads = [threading.Thread(target=edit, args=(content,)) for content in ("first", "second")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(results.values()), ["conflict", "saved"])
+        saved = next(content for content, result in results.items() if result == "saved")
+        self.assertEqual(self.backend.get_entry("Python"), saved)
+
+    def test_creating_an_existing_entry_raises_conflict(self):
+        self.backend.save_entry("Python", "old")
+        with self.assertRaises(EditConflict):
+            self.backend.save_entry("Python", "new", expected_version=content_version(None))
+
+    def test_title_outside_entries_is_rejected(self):
+        for title in ("../evil", "sub/entry", "..\\evil"):
+            with self.subTest(title=title):
+                with self.assertRaises(SuspiciousFileOperation):
+                    self.backend.save_entry(title, "content")
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_edit_with_title_outside_entries_is_a_bad_request(self):
+        response = self.client.post("/edit", {"title": "../evil", "content": "content", "version": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "evil.md")))
+
+
+class EditPageTests(TestCase):
+
+    def test_invalid_form_is_shown_again(self):
+        response = self.client.post("/edit", {"title": "Python", "content": "", "version": ""})
+        self.assertContains(response, "Invalid")
+        self.assertContains(response, "/history/Python")
+
+
+class RenderCacheTests(TemporaryMediaMixin, TestCase):
+
+    def test_changing_extras_rerenders_cached_entries(self):
+        with self.settings(WIKI_MARKDOWN_EXTRAS=[]):
+            util.save_entry("Python", "# Heading")
+            self.assertEqual(util.get_entry_html("Python").strip(), "<h1>Heading</h1>")
+        with self.settings(WIKI_MARKDOWN_EXTRAS=["header-ids"]):
+            self.assertEqual(util.get_entry_html("Python").strip(), '<h1 id="heading">Heading</h1>')
+
+
+class EntryPageTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entry("Python", "# Python\n\nA language.")
+
+    def test_each_encoding_has_its_own_etag(self):
+        identity = self.client.get("/wiki/Python", HTTP_ACCEPT_ENCODING="identity")
+        gzipped = self.client.get("/wiki/Python", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertNotEqual(identity["ETag"], gzipped["ETag"])
+        for response, encoding in ((identity, "identity"), (gzipped, "gzip")):
+            not_modified = self.client.get("/wiki/Python", HTTP_ACCEPT_ENCODING=encoding,
+                                           HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified["ETag"], response["ETag"])
+
+    def test_entry_is_hashed_once_per_request(self):
+        with mock.patch("encyclopedia.views.util.get_entry_version",
+                        wraps=util.get_entry_version) as get_entry_version:
+            self.client.get("/wiki/Python", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(get_entry_version.call_count, 1)
+
+    def test_if_modified_since_alone_does_not_revalidate(self):
+        # backlinks can change without the entry being saved
+        response = self.client.get("/wiki/Python", HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Last-Modified"))
+
+
+class TitleIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = util.TitleIndex(["CSS", "Django", "Git", "HTML", "Python", "python-markdown2"], None)
+
+    def test_containing_matches_case_insensitive_substrings(self):
+        self.assertEqual(self.index.containing("YTHO"), ["Python", "python-markdown2"])
+        self.assertEqual(self.index.containing("down"), ["python-markdown2"])
+        self.assertEqual(self.index.containing("zzz"), [])
+
+    def test_containing_short_queries(self):
+        self.assertEqual(self.index.containing("t"), ["Git", "HTML", "Python", "python-markdown2"])
+        self.assertEqual(self.index.containing("go"), ["Django"])
+        self.assertEqual(self.index.containing(""), list(self.index.titles))
+
+    def test_similar_ranks_misspelt_titles(self):
+        self.assertEqual(self.index.similar("Pythn"), ["Python"])
+        self.assertEqual(self.index.similar("Djang"), ["Django"])
+        self.assertEqual(self.index.similar("qqqq"), [])
+
+    def test_pages_follow_the_cursor_to_the_end(self):
+        pages = []
+        cursor = None
+        while True:
+            titles, cursor = self.index.page(after=cursor, size=4)
+            pages.append(titles)
+            if cursor is None:
+                break
+        self.assertEqual(pages, [["CSS", "Django", "Git", "HTML"], ["Python", "python-markdown2"]])
+
+    def test_page_of_a_letter(self):
+        self.assertEqual(self.index.page(letter="p", size=1), (["Python"], "Python"))
+        self.assertEqual(self.index.page(letter="P", after="Python", size=1), (["python-markdown2"], None))
+        self.assertEqual(self.index.page(letter="z"), ([], None))
+        self.assertEqual(self.index.letters, ["C", "D", "G", "H", "P"])
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        search_index.rebuild([
+            ("Python", "Python is a language. Python code is readable."),
+            ("Django", "Django is a web framework written in Python, with a long description of its many parts."),
+            ("Git", "Git is a version control system."),
+        ])
+
+    def test_search_ranks_frequent_terms_in_short_entries_first(self):
+        self.assertEqual(search_index.search("python"), ["Python", "Django"])
+
+    def test_rare_terms_outweigh_common_ones(self):
+        self.assertEqual(search_index.search("is version")[0], "Git")
+
+    def test_update_replaces_postings(self):
+        search_index.update("Git", "Git tracks Python code.")
+        self.assertEqual(search_index.search("version"), [])
+        self.assertIn("Git", search_index.search("python"))
+
+    def test_query_without_tokens_finds_nothing(self):
+        self.assertEqual(search_index.search("?!"), [])
+        self.assertEqual(search_index.search("missing"), [])
+
+
+class LinkTests(TestCase):
+
+    def test_extract_inline_and_reference_links(self):
+        content = ("See [Python](/wiki/Python) and [the web](wiki/Django#intro).\n"
+                   "[git]: </wiki/Version%20control>\n"
+                   "Not a link: /wiki/HTML, [CSS](https://example.com/wiki/CSS)\n")
+        self.assertEqual(links.extract_links(content), {"Python", "Django", "Version control"})
+
+    def test_backlinks_broken_links_and_orphans(self):
+        links.rebuild([("Python", "[Django](/wiki/Django) [Python](/wiki/Python)"),
+                       ("Django", "[Missing](/wiki/Missing)"),
+                       ("Git", "")])
+        self.assertEqual(links.backlinks("Django"), ["Python"])
+        self.assertEqual(links.broken_links(["Python", "Django", "Git"]), [("Django", "Missing")])
+        self.assertEqual(links.orphans(["Python", "Django", "Git"]), ["Python", "Git"])
+        links.update("Python", "")
+        self.assertEqual(links.backlinks("Django"), [])
+
+
+class RevisionTests(TestCase):
+
+    def test_delta_round_trip(self):
+        old = "one\ntwo\nthree\n"
+        new = "zero\none\nthree\nfour"
+        self.assertEqual(revisions.apply_delta(old, revisions.make_delta(old, new)), new)
+        self.assertEqual(revisions.apply_delta(new, revisions.make_delta(new, "")), "")
+
+    def test_content_at_past_a_snapshot_boundary(self):
+        count = revisions.SNAPSHOT_INTERVAL * 2 + 3
+        contents = [f"# Python\n\nrevision {number}\n" + "line\n" * number for number in range(1, count + 1)]
+        for content in contents:
+            revisions.record("Python", content)
+        snapshots = [revision.number for revision in revisions.history("Python").filter(snapshot__isnull=False)]
+        self.assertEqual(snapshots, [21, 11, 1])
+        for number, content in enumerate(contents, 1):
+            self.assertEqual(revisions.content_at("Python", number), content)
+        self.assertIsNone(revisions.content_at("Python", count + 1))
+
+    def test_racing_record_takes_the_next_number(self):
+        revisions.record("Python", "first")
+        first = QuerySet.first
+        calls = []
+
+        def stale_first(queryset):
+            # the first lookup misses the revision a concurrent save just made
+            calls.append(queryset)
+            return None if len(calls) == 1 else first(queryset)
+
+        with mock.patch.object(QuerySet, "first", stale_first):
+            number = revisions.record("Python", "second")
+        self.assertEqual(number, 2)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(revisions.content_at("Python", 1), "first")
+        self.assertEqual(revisions.content_at("Python", 2), "second")
+
+
+class SectionIndexTests(SimpleTestCase):
+
+    def test_sections_are_byte_ranges_including_subsections(self):
+        data = ("# Café\r\n\nÜber.\n\n## Usage ##\n\n```\n# not a heading\n```\n"
+                "## Usage\n\n# Déjà vu\n").encode("utf-8")
+        index = sections.build_section_index(data)
+        self.assertEqual([(section["level"], section["title"], section["slug"]) for section in index],
+                         [(1, "Café", "cafe"), (2, "Usage", "usage"), (2, "Usage", "usage-2"),
+                          (1, "Déjà vu", "deja-vu")])
+        text = [data[section["start"]:section["end"]].decode("utf-8") for section in index]
+        self.assertEqual(text, ["# Café\r\n\nÜber.\n\n## Usage ##\n\n```\n# not a heading\n```\n## Usage\n\n",
+                                "## Usage ##\n\n```\n# not a heading\n```\n",
+                                "## Usage\n\n",
+                                "# Déjà vu\n"])
+
+    def test_content_without_headings(self):
+        self.assertEqual(sections.build_section_index(b"Just text.\n"), [])
+
+
+class ImportEntriesTests(TemporaryMediaMixin, TestCase):
+
+    def test_import_in_batches_keeps_history_of_overwritten_entries(self):
+        util.save_entry("Python", "old")
+        dump = os.path.join(self.root, "dump.jsonl")
+        with open(dump, "w", encoding="utf-8") as f:
+            for title, content in (("Python", "new"), ("Django", "# Django"), ("Git", "# Git")):
+                f.write(json.dumps({"title": title, "content": content}) + "\n")
+        call_command("import_entries", dump, workers=1, batch_size=2, stdout=io.StringIO())
+        self.assertEqual(util.list_entries(), ["Django", "Git", "Python"])
+        self.assertEqual([revision.number for revision in revisions.history("Python")], [2, 1])
+        self.assertEqual(revisions.content_at("Python", 1), "old")
+        self.assertIn("<h1", util.get_entry_html("Git"))
@@ -1,11 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# the read-only pages can be served by async views when running under ASGI
+if getattr(settings, "WIKI_ASYNC_VIEWS", False):
+    from . import async_views as read_views
+else:
+    read_views = views
+
 urlpatterns = [
-    path("", views.index, name="index"),
-    path("wiki/<str:title>", views.entry, name="entry"),
-    path("search", views.search, name="search"),
-    path("random_page", views.random_page, name="random_page"),
+    path("", read_views.index, name="index"),
+    path("wiki/<str:title>", read_views.entry, name="entry"),
+    path("api/wiki/<str:title>/sections", views.entry_sections, name="entry_sections"),
+    path("api/wiki/<str:title>/sections/<str:slug>", views.entry_section, name="entry_section"),
+    path("search", read_views.search, name="search"),
+    path("autocomplete", views.autocomplete, name="autocomplete"),
+    path("random_page", read_views.random_page, name="random_page"),
     path("new", views.create_new_page, name="create_new_page"),
     path("edit", views.edit_page, name="edit_page"),
+    path("links", views.link_report, name="link_report"),
+    path("history/<str:title>", views.history, name="history"),
+    path("diff/<str:title>", views.diff, name="diff"),
 ]
@@ -1,28 +1,289 @@
-import re
+import bisect
+import hashlib
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import nullcontext
 
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from . import links, render, revisions, search_index, sections
+from .backends import EditConflict, content_version
+
+
+def trigrams(text):
+    """ Returns the set of trigrams of the space-padded, lowercased text. """
+    padded = f" {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """ Sorted titles of all entries plus a lowercase -> canonical title map. """
+
+    def __init__(self, titles, stamp):
+        self.titles = tuple(titles)
+        self.stamp = stamp
+        self.by_lower = {title.lower(): title for title in self.titles}
+        self.checked = 0.0
+        self.generation = None
+
+    @cached_property
+    def lowered(self):
+        """ The lowercased titles, in the same order as the titles. """
+        return tuple(title.lower() for title in self.titles)
+
+    @cached_property
+    def trigram_map(self):
+        """
+        Maps each title trigram to the positions of the titles containing
+        it. Also records the size of every title's trigram set in
+        trigram_counts, for similar().
+        """
+        trigram_map = defaultdict(list)
+        counts = []
+        for position, title in enumerate(self.titles):
+            title_trigrams = trigrams(title)
+            counts.append(len(title_trigrams))
+            for trigram in title_trigrams:
+                trigram_map[trigram].append(position)
+        self.trigram_counts = counts
+        return dict(trigram_map)
+
+    @cached_property
+    def short_map(self):
+        """
+        Maps every one and two character substring of the lowercased
+        titles to the positions of the titles containing it, for queries
+        too short to have a trigram.
+        """
+        short_map = defaultdict(list)
+        for position, title in enumerate(self.lowered):
+            substrings = {title[i:i + length] for length in (1, 2) for i in range(len(title) - length + 1)}
+            for substring in substrings:
+                short_map[substring].append(position)
+        return dict(short_map)
+
+    def containing(self, query):
+        """ Returns the titles having the query as a case-insensitive substring. """
+        query = query.lower()
+        if not query:
+            return list(self.titles)
+        # a query shorter than a trigram is looked up whole in the short substring map
+        if len(query) < 3:
+            return [self.titles[position] for position in self.short_map.get(query, ())]
+        query_trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        postings = sorted((self.trigram_map.get(trigram, ()) for trigram in query_trigrams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return [self.titles[position] for position in sorted(candidates)
+                if query in self.lowered[position]]
+
+    @cached_property
+    def ordered(self):
+        """ Titles and their lowercase sort keys, in case-insensitive order. """
+        titles = sorted(self.titles, key=str.lower)
+        return titles, [title.lower() for title in titles]
+
+    @cached_property
+    def letters(self):
+        """ The distinct first letters of all titles, uppercased and sorted. """
+        return sorted({key[0].upper() for key in self.ordered[1] if key})
+
+    def page(self, letter=None, after=None, size=200):
+        """
+        Returns a page of up to `size` titles in case-insensitive order,
+        optionally restricted to titles starting with `letter`, beginning
+        right after the cursor title `after`. Also returns the cursor of
+        the next page, or None if this is the last one.
+        """
+        titles, keys = self.ordered
+        start, end = 0, len(keys)
+        if letter:
+            prefix = letter.lower()
+            start = bisect.bisect_left(keys, prefix)
+            # every key starting with the prefix sorts below prefix + the largest character
+            end = bisect.bisect_left(keys, prefix + chr(0x10FFFF), start)
+        if after:
+            start = max(start, bisect.bisect_right(keys, after.lower()))
+        stop = min(start + size, end)
+        next_cursor = titles[stop - 1] if stop < end else None
+        return titles[start:stop], next_cursor
+
+    def complete(self, prefix, limit=10):
+        """ Returns up to `limit` titles starting with the prefix, case-insensitively. """
+        titles, keys = self.ordered
+        prefix = prefix.lower()
+        start = bisect.bisect_left(keys, prefix)
+        results = []
+        for position in range(start, min(start + limit, len(keys))):
+            if not keys[position].startswith(prefix):
+                break
+            results.append(titles[position])
+        return results
+
+    def similar(self, query, limit=5, threshold=0.3):
+        """
+        Returns up to `limit` titles most similar to the query, ranked by
+        the Jaccard similarity of their trigram sets. Used to suggest
+        titles for misspelt queries.
+        """
+        # building the map also records trigram_counts
+        trigram_map = self.trigram_map
+        counts = self.trigram_counts
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(trigram_map.get(trigram, ()))
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (len(query_trigrams) + counts[position] - count)
+            if similarity >= threshold:
+                scored.append((-similarity, self.titles[position]))
+        return [title for _, title in sorted(scored)[:limit]]
+
+
+DEFAULT_BACKEND = "encyclopedia.backends.FileBackend"
+
+# Seconds for which the title index is trusted without asking the backend
+# whether entries changed. Writes made through save_entry, in any process,
+# invalidate it at once through the shared generation token.
+TITLE_INDEX_CHECK_INTERVAL = 1.0
+
+GENERATION_KEY = "entries_generation"
+
+_backend = None
+_title_index = None
+_title_index_lock = threading.Lock()
+
+
+def backend():
+    """
+    Returns the entry storage backend configured by the WIKI_ENTRY_BACKEND
+    and WIKI_ENTRY_BACKEND_OPTIONS settings.
+    """
+    global _backend
+    if _backend is None:
+        backend_class = import_string(getattr(settings, "WIKI_ENTRY_BACKEND", DEFAULT_BACKEND))
+        _backend = backend_class(**getattr(settings, "WIKI_ENTRY_BACKEND_OPTIONS", {}))
+    return _backend
+
+
+def entries_generation():
+    """
+    Returns the token that changes whenever any worker process saves
+    entries. It lives in the shared cache, so every process sees it.
+    """
+    return cache.get(GENERATION_KEY)
+
+
+def title_index(generation=None):
+    """
+    Returns the cached TitleIndex, rebuilding it only if some process
+    saved entries since it was built, or if the backend reports that
+    entries have changed (e.g. files edited outside the Wiki). A caller
+    that already read entries_generation() can pass it in, so that this
+    function makes no cache calls.
+    """
+    global _title_index
+    index = _title_index
+    if generation is None:
+        generation = entries_generation()
+    now = time.monotonic()
+    if index is not None and index.generation == generation:
+        # the backend is asked for its stamp at most once per check interval
+        if now - index.checked < TITLE_INDEX_CHECK_INTERVAL:
+            return index
+        stamp = backend().stamp()
+        if stamp is not None and index.stamp == stamp:
+            index.checked = now
+            return index
+    with _title_index_lock:
+        stamp = backend().stamp()
+        index = _title_index
+        if (index is None or index.generation != generation
+                or index.stamp != stamp or stamp is None):
+            index = TitleIndex(backend().list_entries(), stamp)
+            index.generation = generation
+            _title_index = index
+        index.checked = now
+        return index
+
+
+def invalidate_title_index():
+    """
+    Drops the cached title index, and tells the other processes to drop
+    theirs, so the next lookup everywhere rebuilds it.
+    """
+    global _title_index
+    _title_index = None
+    # a fresh random token rather than a counter, so concurrent writers
+    # can never end up publishing the same value
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
 
 
 def list_entries():
     """
     Returns a list of all names of encyclopedia entries.
     """
-    _, filenames = default_storage.listdir("entries")
-    return list(sorted(re.sub(r"\.md$", "", filename)
-                for filename in filenames if filename.endswith(".md")))
+    return list(title_index().titles)
+
+
+def random_entry():
+    """
+    Returns the title of a randomly chosen entry, or None if there are no
+    entries. Picks straight from the cached title index in O(1).
+    """
+    titles = title_index().titles
+    return random.choice(titles) if titles else None
+
+
+def find_entry(title):
+    """
+    Returns the canonical title of the entry matching the given title
+    case-insensitively, or None if there is no such entry.
+    """
+    return title_index().by_lower.get(title.lower())
 
 
-def save_entry(title, content):
+def save_entry(title, content, expected_version=None):
     """
     Saves an encyclopedia entry, given its title and Markdown
     content. If an existing entry with the same title already exists,
-    it is replaced.
+    it is replaced. If expected_version is given (see entry_version),
+    raises EditConflict instead of overwriting an entry that has
+    changed since that version.
+    """
+    write_entry(title, content, expected_version)
+    invalidate_title_index()
+    if not backend().supports_search:
+        search_index.update(title, content)
+    links.update(title, content)
+    # pre-warm the render cache so the first view after an edit is fast
+    cache_entry_html(title, content, render.render(content))
+    cache_entry_sections(title, content)
+
+
+def write_entry(title, content, expected_version=None):
+    """
+    Stores the entry and records it in its revision history, without
+    updating the title, search and link indexes or the caches. Used by
+    save_entry and by bulk imports, which rebuild those once at the end.
     """
-    filename = f"entries/{title}.md"
-    if default_storage.exists(filename):
-        default_storage.delete(filename)
-    default_storage.save(filename, ContentFile(content))
+    if not revisions.has_history(title):
+        # keep the version saved before history was recorded
+        original = get_entry(title)
+        if original is not None:
+            revisions.record(title, original)
+    backend().save_entry(title, content, expected_version)
+    revisions.record(title, content)
 
 
 def get_entry(title):
@@ -30,8 +291,127 @@ def get_entry(title):
     Retrieves an encyclopedia entry by its title. If no such
     entry exists, the function returns None.
     """
-    try:
-        f = default_storage.open(f"entries/{title}.md")
-        return f.read().decode("utf-8")
-    except FileNotFoundError:
+    return backend().get_entry(title)
+
+
+def entry_version(content):
+    """
+    Returns the version tag of the given entry content, to be passed
+    back to save_entry as expected_version. A missing entry (None)
+    has the empty version.
+    """
+    return content_version(content)
+
+
+def get_entry_version(title):
+    """
+    Returns the version tag of the stored entry, the empty string if no
+    such entry exists. Backends that can hash an entry without decoding
+    it do so.
+    """
+    if hasattr(backend(), "version"):
+        return backend().version(title)
+    return content_version(get_entry(title))
+
+
+def search_entries(query, limit=50):
+    """
+    Returns titles of entries whose content matches the query, best match
+    first, using the backend's own full-text search if it has one.
+    """
+    if backend().supports_search:
+        return backend().search(query, limit)
+    return search_index.search(query, limit)
+
+
+def _html_cache_key(title, version):
+    # renders made with other extras or another markdown2 are never reused
+    digest = hashlib.sha256(f"{title}\0{version}\0{render.signature()}".encode("utf-8")).hexdigest()
+    return f"entry_html:{digest}"
+
+
+def cache_entry_html(title, content, html):
+    """ Stores the HTML rendered from the given entry content in the render cache. """
+    cache.set(_html_cache_key(title, content_version(content)), html, None)
+
+
+def get_cached_entry_html(title, version):
+    """ Returns the cached HTML of the given version of the entry, or None on a cache miss. """
+    return cache.get(_html_cache_key(title, version))
+
+
+def get_entry_html(title, version=None):
+    """
+    Returns the entry rendered to HTML, or None if no such entry exists.
+    Renders are cached by title and content hash, so an unchanged entry
+    is never converted twice and an edited one never served stale. The
+    content is only decoded when the render cache misses. A caller that
+    already has the entry's version can pass it in to skip hashing it.
+    """
+    if version is None:
+        version = get_entry_version(title)
+    if not version:
+        return None
+    html = get_cached_entry_html(title, version)
+    if html is None:
+        content = get_entry(title)
+        if content is None:
+            return None
+        html = render.render(content)
+        cache_entry_html(title, content, html)
+    return html
+
+
+def _sections_cache_key(title, version):
+    digest = hashlib.sha256(f"{title}\0{version}".encode("utf-8")).hexdigest()
+    return f"entry_sections:{digest}"
+
+
+def cache_entry_sections(title, content):
+    """ Computes the section index of the given entry content and caches it. """
+    index = sections.build_section_index(content.encode("utf-8"))
+    cache.set(_sections_cache_key(title, content_version(content)), index, None)
+    return index
+
+
+def _open_entry_bytes(title):
+    # memory mapped if the backend supports it, encoded content otherwise
+    if hasattr(backend(), "open_entry"):
+        return backend().open_entry(title)
+    content = get_entry(title)
+    return nullcontext(content.encode("utf-8") if content is not None else None)
+
+
+def get_entry_sections(title):
+    """
+    Returns the section index of the entry (see
+    sections.build_section_index), or None if no such entry exists.
+    """
+    version = get_entry_version(title)
+    if not version:
+        return None
+    index = cache.get(_sections_cache_key(title, version))
+    if index is None:
+        with _open_entry_bytes(title) as data:
+            if data is None:
+                return None
+            index = sections.build_section_index(data)
+        cache.set(_sections_cache_key(title, version), index, None)
+    return index
+
+
+def get_entry_section_html(title, slug):
+    """
+    Returns the given section of the entry rendered to HTML, or None if
+    there is no such entry or section. Only the section's bytes are read
+    and rendered.
+    """
+    index = get_entry_sections(title)
+    section = next((section for section in index or () if section["slug"] == slug), None)
+    if section is None:
         return None
+    with _open_entry_bytes(title) as data:
+        if data is None:
+            return None
+        content = str(data[section["start"]:section["end"]], "utf-8")
+    return render.render(content)
@@ -1,14 +1,18 @@
-import random
-
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
 from django.urls import reverse
 from django import forms
 from django.contrib import messages
 
-from . import util
+from . import links, pages, revisions, util
+
 
-import markdown2
+# default and largest number of titles returned by autocomplete
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
 
 
 class EntryForm(forms.Form):
@@ -27,42 +31,154 @@ class EntryForm(forms.Form):
             'placeholder': 'Write your article here'
         })
     )
+    # version of the entry the edit is based on, to detect concurrent edits
+    version = forms.CharField(required=False, widget=forms.HiddenInput())
 
 
 def index(request):
-    entries = util.list_entries()
+    index = util.title_index()
+
+    # the full listing is streamed, so it never has to be held in memory
+    if request.GET.get('all'):
+        head, tail = pages.index_frame(request)
+        return StreamingHttpResponse(pages.stream_index(head, index.ordered[0], tail))
+
+    letter = request.GET.get('letter')
+    entries, next_cursor = index.page(
+        letter=letter,
+        after=request.GET.get('after'),
+        size=getattr(settings, 'WIKI_INDEX_PAGE_SIZE', 200)
+    )
     return render(request, "encyclopedia/index.html", {
-        "entries": entries
+        "entries": entries,
+        "letters": index.letters,
+        "letter": letter,
+        "next_cursor": next_cursor
     })
 
+def _entry_state(request, title):
+    """
+    Returns the entry's version, its backlinks and the ETag of its page.
+    They are read once per request, although both condition() and
+    _entry_response need them.
+    """
+    state = getattr(request, '_entry_state', None)
+    if state is None:
+        version = util.get_entry_version(title)
+        # the page also lists backlinks, which change when other entries are edited
+        backlinks = links.backlinks(title) if version else []
+        etag = pages.entry_etag(version, backlinks) if version else None
+        state = request._entry_state = (version, backlinks, etag)
+    return state
+
+def _entry_etag(request, title):
+    _, _, etag = _entry_state(request, title)
+    return pages.encoded_etag(etag, pages.entry_encoding(request))
+
+# answer If-None-Match with 304 before anything is rendered; there is no
+# Last-Modified, as the page also changes with its backlinks and the render
+# configuration, which the entry's mtime does not cover
+@condition(etag_func=_entry_etag)
 def entry(request, title):
-    entry_content = util.get_entry(title)
-    if entry_content is not None:
-        entry_content = markdown2.markdown(entry_content)
+    return _entry_response(request, title)
+
+def _render_entry(request, title, version, backlinks):
+    entry_content = util.get_entry_html(title, version) if version else None
     return render(request, "encyclopedia/entry.html", {
         "title": title,
-        "entry": entry_content
+        "entry": entry_content,
+        "backlinks": backlinks if entry_content is not None else []
+    })
+
+def _entry_response(request, title):
+    """
+    Renders the entry page. If the client accepts a compressed encoding,
+    the page is served from the cache precompressed, so it is compressed
+    once per change of the entry rather than on every request.
+    """
+    encoding = pages.entry_encoding(request)
+    version, backlinks, etag = _entry_state(request, title)
+    if encoding is None or etag is None:
+        response = _render_entry(request, title, version, backlinks)
+    else:
+        body = pages.cached_entry_page(title, etag, encoding)
+        if body is None:
+            bodies = pages.compress_entry_page(_render_entry(request, title, version, backlinks).content)
+            pages.cache_entry_page(title, etag, bodies)
+            body = bodies[encoding]
+        response = pages.compressed_response(body, encoding)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+def entry_sections(request, title):
+    """ Returns the entry's table of contents as JSON. """
+    index = util.get_entry_sections(title)
+    if index is None:
+        return JsonResponse({"error": f"Entry {title} does not exist."}, status=404)
+    return JsonResponse({
+        "title": title,
+        "sections": [{"level": section["level"], "title": section["title"], "slug": section["slug"]}
+                     for section in index]
+    })
+
+def entry_section(request, title, slug):
+    """ Returns a single section of the entry, rendered to HTML, as JSON. """
+    html = util.get_entry_section_html(title, slug)
+    if html is None:
+        return JsonResponse({"error": f"Entry {title} has no section {slug}."}, status=404)
+    return JsonResponse({
+        "title": title,
+        "section": slug,
+        "html": html
+    })
+
+def link_report(request):
+    titles = util.list_entries()
+    return render(request, "encyclopedia/links.html", {
+        "broken_links": links.broken_links(titles),
+        "orphans": links.orphans(titles)
     })
 
 def search(request):
     search_query = request.GET.get('q')
-    entries = util.list_entries()
+    index = util.title_index()
     
     # If the query matches the name of an encyclopedia entry, 
     # the user should be redirected to that entry?s page.
-    if search_query.lower() in [entry.lower() for entry in entries]:
-        return HttpResponseRedirect(reverse("entry", args=[search_query]))
+    title = index.by_lower.get(search_query.lower())
+    if title is not None:
+        return HttpResponseRedirect(reverse("entry", args=[title]))
     
     # otherwise the user should instead be taken to a search results page that 
     # displays a list of all encyclopedia entries that have the query as a substring.
     else:
-        search_results = [entry for entry in entries if search_query.lower() in entry.lower()]
+        search_results = index.containing(search_query)
+        # followed by entries mentioning the query in their content, best match first
+        title_matches = set(search_results)
+        search_results += [title for title in util.search_entries(search_query)
+                           if title not in title_matches]
         return render(request, "encyclopedia/search.html", {
-            "search_results": search_results
+            "search_results": search_results,
+            # "did you mean" suggestions for misspelt titles
+            "suggestions": [] if search_results else index.similar(search_query)
         })
 
+def autocomplete(request):
+    """ Returns titles starting with the query as JSON, for search-as-you-type. """
+    query = request.GET.get('q', '')
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return HttpResponseBadRequest("limit must be an integer.")
+    return JsonResponse({
+        "query": query,
+        "results": util.title_index().complete(query, limit) if query else []
+    })
+
 def random_page(request):
-    title = random.choice(util.list_entries())
+    title = util.random_entry()
+    if title is None:
+        return HttpResponseRedirect(reverse("index"))
     return HttpResponseRedirect(reverse("entry", args=[title]))
 
 def create_new_page(request):
@@ -77,9 +193,15 @@ def create_new_page(request):
             content = form.cleaned_data["content"]
             
             # check if title does not exist yet
-            if title.lower() not in [entry.lower() for entry in util.list_entries()]:
-                # save entry
-                util.save_entry(title, content)
+            if util.find_entry(title) is None:
+                # save entry, unless someone created it in the meantime
+                try:
+                    util.save_entry(title, content, expected_version=util.entry_version(None))
+                except util.EditConflict:
+                    messages.error(request, "An entry with the same title already exists!")
+                    return render(request, "encyclopedia/new.html", {
+                        "form": form
+                    })
                 # redirect to the entry's page
                 messages.success(request, "The entry was successfully saved.")
                 return HttpResponseRedirect(reverse("entry", args=[title]))
@@ -110,11 +232,13 @@ def edit_page(request):
         content = util.get_entry(title)
         form = EntryForm(initial={
             'title' : title,
-            'content' : content
+            'content' : content,
+            'version' : util.entry_version(content)
         })
         form.fields['title'].widget.attrs['readonly'] = True
         return render(request, "encyclopedia/edit.html", {
-            "form": form
+            "form": form,
+            "title": title
         })
 
     # an entry was updated on the edit page
@@ -127,8 +251,24 @@ def edit_page(request):
             title = form.cleaned_data["title"]
             content = form.cleaned_data["content"]
         
-            # save entry
-            util.save_entry(title, content)
+            # save entry, unless it was changed since the edit page was loaded
+            try:
+                util.save_entry(title, content, expected_version=form.cleaned_data["version"] or None)
+            except util.EditConflict:
+                messages.error(request, "This entry was changed by someone else while you were editing it. "
+                                        "Review the latest version below and save again to overwrite it.")
+                # keep the user's text, but base the next attempt on the latest version
+                latest = util.get_entry(title) or ""
+                data = request.POST.copy()
+                data['version'] = util.entry_version(latest)
+                form = EntryForm(data)
+                form.fields['title'].widget.attrs['readonly'] = True
+                return render(request, "encyclopedia/edit.html", {
+                    "form": form,
+                    "title": title,
+                    # what saving would change in the latest version
+                    "diff": revisions.diff_lines(latest, content, "latest version", "your version")
+                })
             # redirect to the entry's page
             messages.success(request, "The entry was successfully updated.")
             return HttpResponseRedirect(reverse("entry", args=[title]))
@@ -136,5 +276,33 @@ def edit_page(request):
             messages.error(request, "Invalid")
             # render tasks/add.html page but with existing inputs
             return render(request, "encyclopedia/edit.html", {
-                "form": form
-            })
\ No newline at end of file
+                "form": form,
+                "title": request.POST.get('title')
+            })
+
+
+def history(request, title):
+    return render(request, "encyclopedia/history.html", {
+        "title": title,
+        "revisions": revisions.history(title)
+    })
+
+
+def diff(request, title):
+    # compares revision "from" to revision "to", by default the latest with the one before
+    latest = revisions.history(title).first()
+    try:
+        new_number = int(request.GET.get('to') or (latest.number if latest else 0))
+        old_number = int(request.GET.get('from') or new_number - 1)
+    except ValueError:
+        return HttpResponseBadRequest("Revision numbers must be integers.")
+    old = revisions.content_at(title, old_number)
+    new = revisions.content_at(title, new_number)
+    if new is None:
+        raise Http404(f"Entry {title} has no revision {new_number}.")
+    return render(request, "encyclopedia/diff.html", {
+        "title": title,
+        "old_number": old_number,
+        "new_number": new_number,
+        "diff": revisions.diff_lines(old or "", new, f"#{old_number}", f"#{new_number}")
+    })
@@ -82,6 +82,25 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Database backed, so that rendered entries and the generation token that
+# keeps the title indexes of all worker processes coherent are shared between
+# them. Every request reads the token, and the file based cache lists its
+# whole directory on every set. Create the table with
+# `python manage.py createcachetable` (see README.md).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'wiki_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -120,6 +139,33 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# collectstatic copies static files here, along with precompressed .gz/.br
+# siblings for the web server to serve (e.g. nginx gzip_static)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+
+# Wiki entry storage
+# Entries are stored as entries/*.md files by default. To keep them in a
+# SQLite database with full-text search instead, run
+# `python manage.py migrate_entries_to_sqlite` and set:
+#
+# WIKI_ENTRY_BACKEND = 'encyclopedia.backends.SQLiteBackend'
+# WIKI_ENTRY_BACKEND_OPTIONS = {'path': os.path.join(BASE_DIR, 'entries.sqlite3')}
+
+WIKI_ENTRY_BACKEND = 'encyclopedia.backends.FileBackend'
+WIKI_ENTRY_BACKEND_OPTIONS = {}
+
+# Number of titles per page on the index page
+WIKI_INDEX_PAGE_SIZE = 200
+
+# markdown2 extras used to render entries
+# https://github.com/trentm/python-markdown2/wiki/Extras
+WIKI_MARKDOWN_EXTRAS = ['fenced-code-blocks', 'tables', 'toc']
+
+# Serve the index, entry, search and random pages with async views.
+# Only worthwhile when running under ASGI (wiki/asgi.py).
+WIKI_ASYNC_VIEWS = False
+
 
 # Bootstrap tags for flash messages
 try:
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from auctions.models import Bid, Listing
+
+
+class Command(BaseCommand):
+    help = "Fills current_price, current_bid and bid_count of every listing from its bids."
+
+    def handle(self, *args, **options):
+        # the highest bid wins, the earliest one on a tie
+        highest_bid = Bid.objects.filter(listing=OuterRef('pk')).order_by('-price', 'time')
+        bid_count = (Bid.objects.filter(listing=OuterRef('pk')).order_by()
+                     .values('listing').annotate(count=Count('id')).values('count'))
+        updated = Listing.objects.update(
+            current_bid=Subquery(highest_bid.values('id')[:1]),
+            current_price=Subquery(highest_bid.values('price')[:1]),
+            bid_count=Coalesce(Subquery(bid_count, output_field=IntegerField()), Value(0)),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} listings."))
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+
+
+def fill_created_time(apps, schema_editor):
+    # listings from before creation times were recorded are older than every
+    # listing that has one, so they get the earliest known time (and sort by id)
+    Listing = apps.get_model('auctions', 'Listing')
+    earliest = Listing.objects.aggregate(earliest=Min('created_time'))['earliest']
+    Listing.objects.filter(created_time__isnull=True).update(created_time=earliest or timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_auto_20261018_1432'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_created_time, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='listing',
+            name='created_time',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
@@ -1,12 +1,32 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models import Max
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+CATEGORY_COUNTS_KEY = 'category_counts'
+# a backstop for changes that bypass the signals below, such as queryset update()s
+CATEGORY_COUNTS_TIMEOUT = 300
+
+
+def invalidate_category_counts():
+    """ Drops the cached result of Listing.category_counts(), once the current transaction commits. """
+    transaction.on_commit(lambda: cache.delete(CATEGORY_COUNTS_KEY))
 
 
 class User(AbstractUser):
     pass
 
 
+class InvalidBid(Exception):
+    """ Raised when a bid cannot be placed on a listing. """
+
+
 class Category(models.Model):
     """ Class to represent a category. """
 
@@ -24,37 +44,100 @@ class Listing(models.Model):
     image_url = models.URLField(blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings', null=True)
-    created_time = models.DateTimeField(auto_now_add=True, null=True)
+    # not null, because the listing feeds are keyset paginated on it
+    created_time = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True, null=True)
     is_active = models.BooleanField(default=True)
     watchlisted_by = models.ManyToManyField(User, blank=True, related_name='watchlisted_items')
+    # denormalized from the bids, kept up to date by add_bid() and the Bid signals below
+    current_price = models.DecimalField(max_digits=9, decimal_places=2, blank=True, null=True)
+    current_bid = models.ForeignKey('Bid', on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
+    bid_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # keyset pagination of the listing feeds walks these; the active feeds use partial
+        # indexes, because filter(is_active=True) is a bare boolean term an index on
+        # (is_active, ...) cannot seek on in SQLite
+        indexes = [
+            models.Index(fields=['-created_time', '-id'], name='listing_created_idx'),
+            models.Index(fields=['-created_time', '-id'], name='listing_active_created_idx',
+                         condition=Q(is_active=True)),
+            models.Index(fields=['category', '-created_time', '-id'], name='listing_category_created_idx',
+                         condition=Q(is_active=True)),
+        ]
 
     def __str__(self):
         return f"{self.title} | {self.created_by} | {'Active' if self.is_active else 'Closed'} | {self.created_time}"
 
-    def current_bid(self):
-        """ Returns the highest bid for this listing (if has a valid bid). Returns None otherwise. """
-        max_bid_price = self.bids.aggregate(max_bid=Max('price'))['max_bid']
-        if max_bid_price:
-            return Bid.objects.get(listing=self, price=max_bid_price)
-        return None
+    def add_bid(self, bidder, price):
+        """
+        Records a new bid and makes it the current bid of this listing. Returns the bid.
+        Raises InvalidBid if the listing is closed or the price is not higher than the
+        current bid (or the starting bid, if there is no bid yet).
+        """
+        price = Decimal(price)
+        with transaction.atomic():
+            # a conditional update, so the check and the write are one statement: it
+            # locks only this listing's row, and a concurrent bid that committed first
+            # makes the condition fail instead of being overwritten
+            placed = Listing.objects.filter(
+                Q(current_price__lt=price) | Q(current_price__isnull=True, starting_bid__lt=price),
+                pk=self.pk,
+                is_active=True
+            ).update(
+                current_price=price,
+                bid_count=F('bid_count') + 1
+            )
+            if not placed:
+                self.refresh_from_db(fields=['is_active', 'current_price', 'starting_bid'])
+                if not self.is_active:
+                    raise InvalidBid("Invalid bid (auction has been closed)")
+                if self.current_price is not None:
+                    raise InvalidBid("Invalid bid (new bid price must be higher than current bid)")
+                raise InvalidBid("Invalid bid (bid price must be higher than starting bid)")
+            bid = Bid(bidder=bidder, listing=self, price=price)
+            # the summary is already updated, so the Bid signals can skip it
+            bid._summarized = True
+            bid.save()
+            del bid._summarized
+            Listing.objects.filter(pk=self.pk).update(current_bid=bid)
+        self.refresh_from_db(fields=['current_price', 'current_bid', 'bid_count'])
+        return bid
+
+    @staticmethod
+    def bid_summary():
+        """ Returns update() expressions recomputing current_price, current_bid and bid_count from the bids. """
+        bids = Bid.objects.filter(listing=OuterRef('pk'))
+        highest = bids.order_by('-price', 'time')
+        return {
+            'current_bid': Subquery(highest.values('pk')[:1]),
+            'current_price': Subquery(highest.values('price')[:1]),
+            'bid_count': Coalesce(Subquery(bids.order_by().values('listing').annotate(count=Count('pk')).values('count')), 0),
+        }
+
+    def refresh_bid_summary(self):
+        """ Recomputes current_price, current_bid and bid_count from the bids of this listing. """
+        # a single UPDATE, so it neither sends post_save nor overwrites other fields
+        Listing.objects.filter(pk=self.pk).update(**self.bid_summary())
+        self.refresh_from_db(fields=['current_price', 'current_bid', 'bid_count'])
 
     def winner(self):
         """ Returns the winner of this listing (if closed and has a valid bid). Returns None otherwise. """
-        highest_bid = self.current_bid()
-        if not self.is_active and highest_bid:
-            return highest_bid.bidder
+        if not self.is_active and self.current_bid:
+            return self.current_bid.bidder
         return None
 
     @classmethod
     def category_counts(cls):
         """ Returns dictionary mapping {category id : (category name, count)}. """
-        d = dict()
-        for cat in Category.objects.all():
-            cat_id = cat.id
-            cat_name = cat.name
-            cat_count = cls.objects.filter(category=cat, is_active=True).count()
-            d[cat_id] = (cat_name, cat_count)
+        d = cache.get(CATEGORY_COUNTS_KEY)
+        if d is None:
+            # a single grouped query counting the active listings of every category
+            categories = Category.objects.annotate(
+                active_count=Count('listing', filter=Q(listing__is_active=True))
+            ).order_by('id')
+            d = {cat.id: (cat.name, cat.active_count) for cat in categories}
+            cache.set(CATEGORY_COUNTS_KEY, d, CATEGORY_COUNTS_TIMEOUT)
         return d
 
 
@@ -78,3 +161,28 @@ class Comment(models.Model):
 
     def __str__(self):
         return f"{self.created_by} | {self.listing.title} | ${(self.text)[:30]}[...] | {self.created_time}"
+
+
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, update_fields=None, **kwargs):
+    # creating, closing or recategorizing a listing changes the counts, a bid does not
+    if update_fields is None or {'is_active', 'category'} & set(update_fields):
+        invalidate_category_counts()
+
+
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_counts_changed(sender, **kwargs):
+    # post_delete is also sent for queryset deletes and cascades, unlike Model.delete()
+    invalidate_category_counts()
+
+
+@receiver(post_save, sender=Bid)
+@receiver(post_delete, sender=Bid)
+def bid_changed(sender, instance, raw=False, **kwargs):
+    # bids created, edited or deleted outside add_bid(), e.g. in the admin; a
+    # deleted current bid has already been SET_NULL, but the price has not
+    if raw or getattr(instance, '_summarized', False) or instance.listing_id is None:
+        return
+    Listing.objects.filter(pk=instance.listing_id).update(**Listing.bid_summary())
@@ -1,3 +1,193 @@
-from django.test import TestCase
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import User, Listing, Bid, Category
+from .views import LISTINGS_PER_PAGE
+
+
+class IndexQueryCountTests(TestCase):
+    """ The active listings page must not run queries per listing. """
+
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.bidder = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        self.category = Category.objects.create(name='Books')
+
+    def create_listings(self, count):
+        for i in range(count):
+            listing = Listing.objects.create(
+                title=f"Listing {i}",
+                description="Description",
+                starting_bid=10,
+                category=self.category,
+                created_by=self.seller
+            )
+            listing.add_bid(self.bidder, 11)
+
+    def test_query_count_does_not_grow_with_listings(self):
+        for count in (1, 10, 50):
+            self.create_listings(count)
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('index'))
+            self.assertEqual(len(response.context['listings']),
+                             min(Listing.objects.count(), LISTINGS_PER_PAGE))
+
+    def test_pages_cover_every_listing_once(self):
+        self.create_listings(2 * LISTINGS_PER_PAGE + 3)
+        seen = []
+        url = reverse('index')
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            seen.extend(listing.id for listing in response.context['listings'])
+            cursor = response.context['next_cursor']
+            url = reverse('index') + '?' + urlencode({'after': cursor}) if cursor else None
+        self.assertEqual(seen, list(Listing.objects.order_by('-created_time', '-id').values_list('id', flat=True)))
+
+
+class CreatedTimeMigrationTests(TransactionTestCase):
+    """ Listings saved before creation times were recorded get one, so the feeds can page through them. """
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('auctions', target)])
+        return executor.loader.project_state([('auctions', target)]).apps
+
+    def test_null_created_times_are_filled(self):
+        apps = self.migrate('0013_auto_20261018_1432')
+        OldListing = apps.get_model('auctions', 'Listing')
+        legacy = [OldListing.objects.create(title=f"Legacy {i}", description="Description") for i in range(3)]
+        OldListing.objects.filter(pk__in=[listing.pk for listing in legacy]).update(created_time=None)
+        recent = OldListing.objects.create(title="Recent", description="Description")
+
+        self.migrate('0014_listing_created_time_not_null')
+        legacy_times = set(Listing.objects.filter(title__startswith="Legacy").values_list('created_time', flat=True))
+        self.assertEqual(legacy_times, {recent.created_time})
+
+        # the legacy listings come last, and every listing is on exactly one page
+        with mock.patch('auctions.views.LISTINGS_PER_PAGE', 2):
+            seen = []
+            url = reverse('index')
+            while url:
+                response = self.client.get(url)
+                seen.extend(listing.id for listing in response.context['listings'])
+                cursor = response.context['next_cursor']
+                url = reverse('index') + '?' + urlencode({'after': cursor}) if cursor else None
+        self.assertEqual(seen, [recent.pk] + [listing.pk for listing in reversed(legacy)])
+
+
+class CloseAuctionTests(TestCase):
+
+    def test_closing_keeps_a_bid_placed_after_the_listing_was_loaded(self):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        bidder = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        listing = Listing.objects.create(title="Lamp", description="Description",
+                                         starting_bid=10, created_by=seller)
+        stale = Listing.objects.get(pk=listing.pk)
+        listing.add_bid(bidder, 50)
+        with mock.patch('auctions.views.Listing.objects.get', return_value=stale):
+            self.client.force_login(seller)
+            self.client.post(reverse('close_auction'), {'listingId': listing.pk})
+        listing.refresh_from_db()
+        self.assertFalse(listing.is_active)
+        self.assertEqual(listing.bid_count, 1)
+        self.assertEqual(listing.current_price, 50)
+        self.assertEqual(listing.winner(), bidder)
+
+
+class BidSummaryTests(TestCase):
+    """ The denormalized bid summary of a listing follows bids changed outside add_bid(). """
+
+    def setUp(self):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.bidder = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        self.listing = Listing.objects.create(title="Lamp", description="Description",
+                                              starting_bid=10, created_by=seller)
+        self.first = self.listing.add_bid(self.bidder, 20)
+        self.second = self.listing.add_bid(self.bidder, 30)
+
+    def assertSummary(self, current_bid, current_price, bid_count):
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.current_bid, self.listing.current_price, self.listing.bid_count),
+                         (current_bid, current_price, bid_count))
+
+    def test_add_bid_does_not_recompute_the_summary(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.listing.add_bid(self.bidder, 40)
+        self.assertEqual([query['sql'].split()[0] for query in queries
+                          if 'SAVEPOINT' not in query['sql']], ['UPDATE', 'INSERT', 'UPDATE', 'SELECT'])
+
+    def test_deleting_the_current_bid(self):
+        self.second.delete()
+        self.assertSummary(self.first, 20, 1)
+        self.first.delete()
+        self.assertSummary(None, None, 0)
+
+    def test_created_and_edited_bids(self):
+        third = Bid.objects.create(bidder=self.bidder, listing=self.listing, price=50)
+        self.assertSummary(third, 50, 3)
+        third.price = 15
+        third.save()
+        self.assertSummary(self.second, 30, 3)
+
+    def test_refresh_bid_summary(self):
+        Listing.objects.filter(pk=self.listing.pk).update(current_bid=None, current_price=None, bid_count=0)
+        self.listing.refresh_bid_summary()
+        self.assertEqual((self.listing.current_bid, self.listing.current_price, self.listing.bid_count),
+                         (self.second, 30, 2))
+
+    def test_deleting_the_listing(self):
+        self.listing.delete()
+        self.assertFalse(Bid.objects.exists())
+
+
+class CategoryCountsTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.category = Category.objects.create(name='Books')
+
+    def create_listing(self, created_by):
+        return Listing.objects.create(title="Book", description="Description", starting_bid=10,
+                                      category=self.category, created_by=created_by)
+
+    def count(self):
+        return Listing.category_counts()[self.category.id][1]
+
+    def test_counts_follow_created_and_closed_listings(self):
+        # the cached counts are dropped when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            listing = self.create_listing(self.seller)
+        self.assertEqual(self.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.is_active = False
+            listing.save(update_fields=['is_active', 'last_modified'])
+        self.assertEqual(self.count(), 0)
+
+    def test_cascading_delete_invalidates_counts(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_listing(self.seller)
+            self.create_listing(other)
+        self.assertEqual(self.count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(self.count(), 1)
+
+    def test_counts_take_one_query_for_any_number_of_categories(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(10):
+                Category.objects.create(name=f"Category {i}")
+        with CaptureQueriesContext(connection) as queries:
+            Listing.category_counts()
+        self.assertEqual(len([query for query in queries if 'auctions_listing' in query['sql']]), 1)
+        # then they come from the cache
+        with self.assertNumQueries(1):
+            Listing.category_counts()
@@ -1,3 +1,6 @@
+from datetime import datetime
+from decimal import Decimal
+
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError
@@ -8,7 +11,7 @@ from django.urls import reverse
 from django import forms
 from django.contrib import messages
 
-from .models import User, Listing, Bid, Comment, Category
+from .models import User, Listing, Comment, Category, InvalidBid
 
 
 class ListingForm(forms.ModelForm):
@@ -18,11 +21,50 @@ class ListingForm(forms.ModelForm):
         fields = ['title', 'description', 'starting_bid', 'image_url', 'category']
 
 
+LISTINGS_PER_PAGE = 20
+
+
+def paginate_listings(request, listings):
+    """
+    Returns a page of the listings, newest first, and the cursor of the next page (None on the
+    last page). Pages are keyset paginated on (created_time, id): the `after` GET parameter
+    holds the cursor of the last listing shown, so every page is an index range scan no
+    matter how deep it is.
+    """
+    listings = listings.order_by('-created_time', '-id')
+    cursor = request.GET.get('after')
+    if cursor:
+        try:
+            created, listing_id = cursor.rsplit('_', 1)
+            created = datetime.fromisoformat(created)
+            listing_id = int(listing_id)
+        except ValueError:
+            # a malformed cursor shows the first page
+            pass
+        else:
+            # written as a range on created_time, which the index can seek to,
+            # minus the listings created at the same moment that were already shown
+            listings = listings.filter(created_time__lte=created).exclude(
+                created_time=created, id__gte=listing_id
+            )
+    # one extra row tells whether there is a next page
+    page = list(listings[:LISTINGS_PER_PAGE + 1])
+    if len(page) <= LISTINGS_PER_PAGE:
+        return page, None
+    page = page[:LISTINGS_PER_PAGE]
+    last = page[-1]
+    return page, f"{last.created_time.isoformat()}_{last.id}"
+
+
 def index(request):
-    # get list of active listings
-    listings = Listing.objects.filter(is_active=True)
+    # get list of active listings; prices come from the denormalized current_price
+    # and the related rows are joined in, so the page costs one query however many
+    # listings there are
+    listings = Listing.objects.filter(is_active=True).select_related('category', 'created_by')
+    listings, next_cursor = paginate_listings(request, listings)
     return render(request, "auctions/index.html", {
-        "listings": listings
+        "listings": listings,
+        "next_cursor": next_cursor
     })
 
 
@@ -109,7 +151,7 @@ def show_listing(request, listing_id):
     """ Shows a page specific to the listing given as parameter. """
 
     # get listing
-    listing = Listing.objects.get(pk=listing_id)
+    listing = Listing.objects.select_related('current_bid').get(pk=listing_id)
     # check if user is winner - if so, prepare message
     if request.user == listing.winner():
         messages.info(request, 'You have win the auction!') 
@@ -155,34 +197,21 @@ def make_bid(request):
     listing_id = int(request.POST.get('listingId'))
     listing = Listing.objects.get(pk=listing_id)
     # get bid price
-    bid_price = float(request.POST.get('bidPrice'))
+    bid_price = Decimal(request.POST.get('bidPrice'))
 
-    # if there is a bid and bid price not higher then current bid -> error
-    if listing.current_bid() and bid_price <= listing.current_bid().price:
-        # show error message
-        messages.error(request, "Invalid bid (new bid price must be higher than current bid)")
-        return render(request, "auctions/showlisting.html", {
-            "listing": listing,
-        })
-    
-    elif bid_price <= listing.starting_bid:
+    # the price checks and the new bid are done in one atomic operation,
+    # so concurrent bidders cannot both win at the same price
+    try:
+        listing.add_bid(request.user, bid_price)
+    except InvalidBid as e:
         # show error message
-        messages.error(request, "Invalid bid (bid price must be higher than starting bid)")
+        messages.error(request, str(e))
         return render(request, "auctions/showlisting.html", {
             "listing": listing,
         })
 
-    else:       
-        # create the new bid
-        bid = Bid(
-            bidder=request.user, 
-            listing=listing,
-            price=bid_price
-        )
-        bid.save()
-        
-        # return to the page
-        return HttpResponseRedirect(reverse("show_listing", args=[listing_id]))
+    # return to the page
+    return HttpResponseRedirect(reverse("show_listing", args=[listing_id]))
 
 
 @login_required
@@ -200,9 +229,11 @@ def close_auction(request):
             "listing": listing,
         })
 
-    # close listing
+    # close listing; only is_active is written, so a bid placed since the listing
+    # was loaded keeps its denormalized price, current bid and count
     listing.is_active = False
-    listing.save()
+    listing.save(update_fields=['is_active', 'last_modified'])
+    listing.refresh_from_db(fields=['current_price', 'current_bid', 'bid_count'])
 
     messages.warning(request, "Auction has been closed.")
     return render(request, "auctions/showlisting.html", {
@@ -214,25 +245,31 @@ def close_auction(request):
 def my_auctions(request):
     # get list of auctions created by current user
     listings = Listing.objects.filter(created_by=request.user)
+    listings, next_cursor = paginate_listings(request, listings)
     return render(request, "auctions/myauctions.html", {
-        "listings": listings
+        "listings": listings,
+        "next_cursor": next_cursor
     })
 
 
 @login_required
 def my_bids(request):
     # get list of auctions where current user placed a bid
-    listings = Listing.objects.filter(bids__bidder=request.user).distinct()
+    listings = Listing.objects.filter(bids__bidder=request.user).distinct().select_related('current_bid')
+    listings, next_cursor = paginate_listings(request, listings)
     return render(request, "auctions/mybids.html", {
-        "listings": listings
+        "listings": listings,
+        "next_cursor": next_cursor
     })
 
 @login_required
 def my_watchlist(request):
     # get list of auctions where current user placed a bid
-    listings = Listing.objects.filter(watchlisted_by=request.user)
+    listings = Listing.objects.filter(watchlisted_by=request.user).select_related('current_bid')
+    listings, next_cursor = paginate_listings(request, listings)
     return render(request, "auctions/mywatchlist.html", {
-        "listings": listings
+        "listings": listings,
+        "next_cursor": next_cursor
     })
 
 @login_required
@@ -272,9 +309,11 @@ def show_category(request, category_id):
     
     # get list of filtered active listings
     listings = Listing.objects.filter(is_active=True, category=category_id)
+    listings, next_cursor = paginate_listings(request, listings)
     category = Category.objects.get(pk=category_id)
     
     return render(request, "auctions/category.html", {
         "listings": listings,
+        "next_cursor": next_cursor,
         "category": category
     })
\ No newline at end of file
@@ -84,6 +84,19 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# A database cache is shared by all worker processes, so invalidating cached
+# data in one process is seen by every other.
+# Create the table with `python manage.py createcachetable`.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'auctions_cache',
+    }
+}
+
 AUTH_USER_MODEL = 'auctions.User'
 
 # Password validation